@@ -9,11 +9,13 @@ connection issues and provide detailed debugging information.
 import os
 import json
 import time
+import asyncio
 import logging
 import sys
+import functools
+from importlib.metadata import version, PackageNotFoundError
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
-from openai import OpenAI
-from groq import Groq
 
 # Configure logging
 logging.basicConfig(
@@ -29,12 +31,121 @@ load_dotenv()
 # API Configuration
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GROQ_API_URL = os.getenv("GROQ_API_URL", "https://api.groq.com/openai/v1")
+GROQ_KEY_PREFIX = f"{GROQ_API_KEY[:4]}..." if GROQ_API_KEY else None
+
+# Models to probe (prioritizing latest active models)
+TEST_MODELS = (
+    "groq/compound",                 # Primary: Advanced model with built-in tools
+    "llama-3.3-70b-versatile",       # Fallback: Latest flagship model
+    "llama-3.1-8b-instant",          # Fallback: Fast and reliable
+)
+
+# Distributions whose installed versions are reported by check_environment
+REPORTED_PACKAGES = ("openai", "groq", "httpx", "requests", "python-dotenv")
+
+# Endpoints probed for basic network connectivity
+CONNECTIVITY_ENDPOINTS = {
+    "Groq": "https://api.groq.com",
+    "DeepSeek": "https://api.deepseek.com",
+}
+
+@functools.lru_cache(maxsize=None)
+def _pkg_version(name):
+    """Return the installed version of a distribution, or None if it is missing"""
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return None
+
+@functools.lru_cache(maxsize=None)
+def _http_session():
+    """Shared HTTP session so repeated probes reuse pooled TCP/TLS connections"""
+    # Imported here so the script only pays for requests when it probes the network
+    import requests
+    from requests.adapters import HTTPAdapter
+    
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=8))
+    return session
+
+SEPARATOR = "\n" + "=" * 80 + "\n"
 
 def print_separator():
     """Print a separator line for better log readability"""
-    print("\n" + "=" * 80 + "\n")
+    print(SEPARATOR)
+
+async def _first_success(probes):
+    """Race model probes and return True as soon as one succeeds, cancelling the rest"""
+    pending = {asyncio.create_task(p) for p in probes}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None and task.result()[1]:
+                    return True
+        return False
+    finally:
+        for task in pending:
+            task.cancel()
+        # Let the cancelled probes unwind before their client is closed
+        await asyncio.gather(*pending, return_exceptions=True)
 
-def test_groq_with_sdk():
+async def _probe_model(client, model):
+    """Send a minimal chat completion to one model and return (model, ok, duration, err)"""
+    logger.info(f"Testing model: {model}")
+    start_time = time.time()
+    try:
+        response = await client.chat.completions.create(
+            messages=[{"role": "user", "content": "Say hello"}],
+            model=model,
+            max_tokens=5
+        )
+    except Exception as e:
+        duration = time.time() - start_time
+        logger.error(f"❌ Failed with model {model}: {type(e).__name__}: {str(e)}")
+        if hasattr(e, 'response'):
+            try:
+                status = getattr(e.response, 'status_code', 'N/A')
+                headers = getattr(e.response, 'headers', {})
+                body = getattr(e.response, 'text', 'N/A')
+                logger.error("Response Status: %s", status)
+                logger.error("Response Headers: %s", headers)
+                logger.error("Response Body: %s", body)
+            except:
+                pass
+        return model, False, duration, e
+    
+    duration = time.time() - start_time
+    logger.info(f"✅ {model}: Response received in {duration:.2f}s")
+    logger.debug("Response: %r", response)
+    logger.info("Content: %s", response.choices[0].message.content)
+    return model, True, duration, None
+
+async def _probe(make_client, label, list_models=False):
+    """Build a client with make_client and race every TEST_MODELS probe through it"""
+    try:
+        logger.info(f"Initializing {label}...")
+        # The context manager closes the client's connection pool once the probes are done
+        async with make_client() as client:
+            if list_models:
+                # Test available models
+                try:
+                    logger.info("Fetching available models...")
+                    models = await client.models.list()
+                    logger.info("Fetched %d available models", len(models.data))
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("Available models: %s", ", ".join(m.id for m in models.data))
+                except Exception as e:
+                    logger.error(f"❌ Failed to list models: {type(e).__name__}: {str(e)}")
+            
+            # Race every model concurrently and stop at the first one that answers
+            logger.info("Sending test chat completion requests...")
+            return await _first_success(_probe_model(client, m) for m in TEST_MODELS)
+    except Exception as e:
+        logger.error(f"❌ Failed to initialize {label}: {type(e).__name__}: {str(e)}")
+        return False
+
+async def test_groq_with_sdk():
     """Test Groq API with the official Groq SDK"""
     print_separator()
     logger.info("TESTING GROQ API WITH OFFICIAL SDK")
@@ -44,63 +155,12 @@ def test_groq_with_sdk():
         logger.error("❌ GROQ_API_KEY not found in environment variables")
         return False
     
-    logger.info(f"API Key (first 4 chars): {GROQ_API_KEY[:4]}...")
+    logger.info(f"API Key (first 4 chars): {GROQ_KEY_PREFIX}")
     
-    try:
-        logger.info("Initializing Groq client...")
-        client = Groq(api_key=GROQ_API_KEY)
-        
-        # Test available models
-        try:
-            logger.info("Fetching available models...")
-            models = client.models.list()
-            logger.info(f"Available models: {models}")
-        except Exception as e:
-            logger.error(f"❌ Failed to list models: {type(e).__name__}: {str(e)}")
-        
-        # Test with different models (prioritizing latest active models)
-        test_models = [
-            "groq/compound",                 # Primary: Advanced model with built-in tools
-            "llama-3.3-70b-versatile",       # Fallback: Latest flagship model
-            "llama-3.1-8b-instant",          # Fallback: Fast and reliable
-        ]
-        
-        for model in test_models:
-            logger.info(f"\nTesting model: {model}")
-            try:
-                logger.info("Sending test chat completion request...")
-                start_time = time.time()
-                
-                response = client.chat.completions.create(
-                    messages=[{"role": "user", "content": "Say hello"}],
-                    model=model,
-                    max_tokens=5
-                )
-                
-                duration = time.time() - start_time
-                logger.info(f"✅ Response received in {duration:.2f}s")
-                logger.info(f"Response: {response}")
-                logger.info(f"Content: {response.choices[0].message.content}")
-                return True
-            except Exception as e:
-                logger.error(f"❌ Failed with model {model}: {type(e).__name__}: {str(e)}")
-                if hasattr(e, 'response'):
-                    try:
-                        status = getattr(e.response, 'status_code', 'N/A')
-                        headers = getattr(e.response, 'headers', {})
-                        body = getattr(e.response, 'text', 'N/A')
-                        logger.error(f"Response Status: {status}")
-                        logger.error(f"Response Headers: {headers}")
-                        logger.error(f"Response Body: {body}")
-                    except:
-                        pass
-        
-        return False
-    except Exception as e:
-        logger.error(f"❌ Failed to initialize Groq client: {type(e).__name__}: {str(e)}")
-        return False
+    from groq import AsyncGroq
+    return await _probe(lambda: AsyncGroq(api_key=GROQ_API_KEY), "Groq client", list_models=True)
 
-def test_groq_with_openai():
+async def test_groq_with_openai():
     """Test Groq API using the OpenAI client (compatibility mode)"""
     print_separator()
     logger.info("TESTING GROQ API WITH OPENAI CLIENT")
@@ -110,59 +170,19 @@ def test_groq_with_openai():
         logger.error("❌ GROQ_API_KEY not found in environment variables")
         return False
     
-    logger.info(f"API Key (first 4 chars): {GROQ_API_KEY[:4]}...")
+    logger.info(f"API Key (first 4 chars): {GROQ_KEY_PREFIX}")
     logger.info(f"API URL: {GROQ_API_URL}")
     
-    try:
-        logger.info("Initializing OpenAI client for Groq...")
-        client = OpenAI(
+    from openai import AsyncOpenAI
+    return await _probe(
+        lambda: AsyncOpenAI(
             api_key=GROQ_API_KEY,
             base_url=GROQ_API_URL,
             timeout=30.0,
             max_retries=1
-        )
-        
-        # Test with different models (prioritizing latest active models)
-        test_models = [
-            "groq/compound",                 # Primary: Advanced model with built-in tools
-            "llama-3.3-70b-versatile",       # Fallback: Latest flagship model
-            "llama-3.1-8b-instant",          # Fallback: Fast and reliable
-        ]
-        
-        for model in test_models:
-            logger.info(f"\nTesting model: {model}")
-            try:
-                logger.info("Sending test chat completion request...")
-                start_time = time.time()
-                
-                response = client.chat.completions.create(
-                    messages=[{"role": "user", "content": "Say hello"}],
-                    model=model,
-                    max_tokens=5
-                )
-                
-                duration = time.time() - start_time
-                logger.info(f"✅ Response received in {duration:.2f}s")
-                logger.info(f"Response: {response}")
-                logger.info(f"Content: {response.choices[0].message.content}")
-                return True
-            except Exception as e:
-                logger.error(f"❌ Failed with model {model}: {type(e).__name__}: {str(e)}")
-                if hasattr(e, 'response'):
-                    try:
-                        status = getattr(e.response, 'status_code', 'N/A')
-                        headers = getattr(e.response, 'headers', {})
-                        body = getattr(e.response, 'text', 'N/A')
-                        logger.error(f"Response Status: {status}")
-                        logger.error(f"Response Headers: {headers}")
-                        logger.error(f"Response Body: {body}")
-                    except:
-                        pass
-        
-        return False
-    except Exception as e:
-        logger.error(f"❌ Failed to initialize OpenAI client for Groq: {type(e).__name__}: {str(e)}")
-        return False
+        ),
+        "OpenAI client for Groq"
+    )
 
 def check_environment():
     """Check environment variables and dependencies"""
@@ -172,12 +192,12 @@ def check_environment():
     
     # Check API keys
     api_keys = {
-        "GROQ_API_KEY": GROQ_API_KEY
+        "GROQ_API_KEY": GROQ_KEY_PREFIX
     }
     
     for key, value in api_keys.items():
         if value:
-            logger.info(f"✅ {key} is set (first 4 chars: {value[:4]}...)")
+            logger.info(f"✅ {key} is set (first 4 chars: {value})")
         else:
             logger.error(f"❌ {key} is not set")
     
@@ -185,27 +205,39 @@ def check_environment():
     import platform
     logger.info(f"Python Version: {platform.python_version()}")
     
-    # Check OpenAI version
-    try:
-        import openai
-        logger.info(f"OpenAI Version: {openai.__version__}")
-    except ImportError:
-        logger.error("❌ OpenAI package not installed")
-    
-    # Check Groq version
-    try:
-        import groq
-        logger.info(f"Groq Version: {groq.__version__}")
-    except ImportError:
-        logger.error("❌ Groq package not installed")
+    # Check package versions
+    logger.info("Package Versions:")
+    for pkg in REPORTED_PACKAGES:
+        pkg_version = _pkg_version(pkg)
+        if pkg_version:
+            logger.info(f"  - {pkg}: {pkg_version}")
+        else:
+            logger.error(f"❌ {pkg} package not installed")
     
-    # Check network connectivity
-    try:
-        import requests
-        response = requests.get("https://api.groq.com", timeout=5)
-        logger.info(f"✅ Can reach Groq API endpoint. Status: {response.status_code}")
-    except Exception as e:
-        logger.error(f"❌ Cannot reach Groq API endpoint: {str(e)}")
+    # Check network connectivity (HEAD avoids downloading response bodies).
+    # Endpoints are independent, so probe them in parallel and log in completion order.
+    session = _http_session()
+    with ThreadPoolExecutor(max_workers=len(CONNECTIVITY_ENDPOINTS)) as executor:
+        futures = {
+            executor.submit(session.head, url, timeout=5, allow_redirects=False): name
+            for name, url in CONNECTIVITY_ENDPOINTS.items()
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                response = future.result()
+                logger.info(f"✅ Can reach {name} API endpoint. Status: {response.status_code}")
+            except Exception as e:
+                logger.error(f"❌ Cannot reach {name} API endpoint: {str(e)}")
+
+async def _gather_checks():
+    """Run the environment check and both Groq tests concurrently"""
+    return await asyncio.gather(
+        asyncio.to_thread(check_environment),
+        test_groq_with_sdk(),
+        test_groq_with_openai(),
+        return_exceptions=True
+    )
 
 def run_all_tests():
     """Run all diagnostic tests"""
@@ -213,16 +245,9 @@ def run_all_tests():
     logger.info("RUNNING API DIAGNOSTICS")
     print_separator()
     
-    # Check environment
-    check_environment()
-    
-    # Test Groq API
-    groq_sdk_success = test_groq_with_sdk()
-    if not groq_sdk_success:
-        groq_openai_success = test_groq_with_openai()
-    else:
-        groq_openai_success = True
-        logger.info("Skipping OpenAI client Groq test as SDK test was successful")
+    # Every check is independent and network-bound, so run them all at once
+    results = asyncio.run(_gather_checks())
+    groq_sdk_success, groq_openai_success = (r is True for r in results[1:])
     
     # Results summary
     print_separator()
@@ -230,8 +255,7 @@ def run_all_tests():
     print_separator()
     
     logger.info(f"Groq API with SDK: {'✅ PASSED' if groq_sdk_success else '❌ FAILED'}")
-    if not groq_sdk_success:
-        logger.info(f"Groq API with OpenAI client: {'✅ PASSED' if groq_openai_success else '❌ FAILED'}")
+    logger.info(f"Groq API with OpenAI client: {'✅ PASSED' if groq_openai_success else '❌ FAILED'}")
     
     # Overall status
     groq_success = groq_sdk_success or groq_openai_success
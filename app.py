@@ -1,51 +1,86 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session, make_response, flash
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, make_response, Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from urllib.parse import urlencode
 import os
 import requests
-import json
+import orjson
 import logging
+from logging.handlers import QueueHandler, QueueListener
+import queue
+import atexit
 from dotenv import load_dotenv
-from openai import OpenAI
-from authlib.integrations.flask_client import OAuth
-from functools import wraps
+import groq
+from jose import jwt, JWTError
+import httpx
+from functools import wraps, lru_cache
 import time
-from requests.exceptions import RequestException, Timeout, ConnectionError
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import sys
 from flask_session import Session  # Add Flask-Session import
 import redis
+from cachelib import SimpleCache, RedisCache
 from datetime import datetime, timedelta
 import random
 import string
 import traceback
 import re
+from hashlib import blake2b
+from concurrent.futures import ThreadPoolExecutor, Future
+import threading
+
+# Configure logging for Heroku (set LOG_LEVEL=WARNING to quiet per-request logs)
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+
+# Request threads only enqueue log records; a background listener writes them to stdout
+log_queue = queue.Queue(-1)
+log_handler = QueueHandler(log_queue)
+log_listener = QueueListener(log_queue, logging.StreamHandler(sys.stdout))  # Ensure logs go to stdout for Heroku
+log_listener.start()
+atexit.register(log_listener.stop)
 
-# Configure logging for Heroku
 logging.basicConfig(
-    level=logging.INFO,
+    level=LOG_LEVEL,
     format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)  # Ensure logs go to stdout for Heroku
-    ]
+    handlers=[log_handler],
+    force=True  # Replace any root handlers; library loggers propagate to root
 )
 logger = logging.getLogger(__name__)
 
-# Force all loggers to use this configuration
-for log_name, log_obj in logging.Logger.manager.loggerDict.items():
-    if isinstance(log_obj, logging.Logger):
-        log_obj.handlers = []
-        log_obj.addHandler(logging.StreamHandler(sys.stdout))
-        log_obj.setLevel(logging.INFO)
+# Per-request access lines from the development server only add noise
+logging.getLogger('werkzeug').setLevel(logging.WARNING)
 
 # Load environment variables
 load_dotenv()
 
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider that (de)serializes with orjson instead of the stdlib json module"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev_key_please_change')
+app.json = OrjsonProvider(app)
+
+# Sessions are signed with SECRET_KEY, so it must stay stable across restarts and dynos
+SECRET_KEY = os.environ.get('SECRET_KEY')
+if not SECRET_KEY:
+    if os.environ.get('DYNO'):
+        raise RuntimeError("SECRET_KEY must be set in production")
+    logger.warning("SECRET_KEY not set, using an insecure development key")
+    SECRET_KEY = 'dev_key_please_change'
+app.config['SECRET_KEY'] = SECRET_KEY
+
+# Session lifetime in seconds (24 hours by default)
+SESSION_DURATION = int(os.environ.get('SESSION_DURATION', 86400))
 
 # Configure Redis session
 app.config['SESSION_TYPE'] = 'redis'
 app.config['SESSION_PERMANENT'] = True
-app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=24)
+app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(seconds=SESSION_DURATION)
 app.config['SESSION_USE_SIGNER'] = True
 app.config['SESSION_KEY_PREFIX'] = '10x_prompt:'
 
@@ -53,7 +88,7 @@ app.config['SESSION_KEY_PREFIX'] = '10x_prompt:'
 redis_url = os.environ.get('REDIS_URL')
 if redis_url:
     # For Heroku environment - disable SSL certificate verification for Redis
-    logger.info(f"Using Redis URL from environment: {redis_url[:15]}...")
+    logger.info("Using Redis URL from environment: %.15s...", redis_url)
     
     # Configure Redis connection with SSL certificate verification disabled
     redis_client = redis.from_url(
@@ -62,17 +97,17 @@ if redis_url:
     )
     app.config['SESSION_REDIS'] = redis_client
 else:
-    # Fallback to filesystem session for local development
-    logger.warning("No Redis URL found, using filesystem sessions for development")
-    app.config['SESSION_TYPE'] = 'filesystem'
-    app.config['SESSION_FILE_DIR'] = './flask_session'
+    # In-memory sessions are per process, so gunicorn workers on a dyno would not see each other's logins
+    if os.environ.get('DYNO'):
+        raise RuntimeError("REDIS_URL must be set in production")
+    # Fallback to in-memory sessions for local development (lost on restart, single process only)
+    logger.warning("No Redis URL found, using in-memory sessions for development")
+    app.config['SESSION_TYPE'] = 'cachelib'
+    app.config['SESSION_CACHELIB'] = SimpleCache(threshold=5000)
 
 # Initialize Flask-Session
 Session(app)
 
-# Constants
-SESSION_DURATION = int(os.environ.get('SESSION_DURATION', 86400))  # 24 hours in seconds
-
 # Track session creation and access times for debugging
 session_tracker = {}
 
@@ -83,60 +118,265 @@ AUTH0_CLIENT_SECRET = os.environ.get('AUTH0_CLIENT_SECRET')
 AUTH0_CALLBACK_URL = os.environ.get('AUTH0_CALLBACK_URL', 'http://localhost:5000/callback')
 AUTH0_AUDIENCE = os.environ.get('AUTH0_AUDIENCE')
 AUTH0_BASE_URL = f'https://{AUTH0_DOMAIN}'
+AUTH0_AUTHORIZE_URL = f'{AUTH0_BASE_URL}/authorize'
+AUTH0_TOKEN_URL = f'{AUTH0_BASE_URL}/oauth/token'
+AUTH0_USERINFO_URL = f'{AUTH0_BASE_URL}/userinfo'
+AUTH0_LOGOUT_URL = f'{AUTH0_BASE_URL}/v2/logout'
+
+# Groq Configuration
+GROQ_API_KEY = os.environ.get('GROQ_API_KEY')
+GROQ_MODEL = "groq/compound"
+
+# DeepSeek Configuration (fallback provider)
+DEEPSEEK_API_KEY = os.environ.get('DEEPSEEK_API_KEY')
+DEEPSEEK_CHAT_URL = f"{os.environ.get('API_URL', 'https://api.deepseek.com/v1')}/chat/completions"
+DEEPSEEK_MODEL = "deepseek-chat"
+DEEPSEEK_HEADERS = {"Authorization": f"Bearer {DEEPSEEK_API_KEY}", "Content-Type": "application/json"}
+
+# Pooled HTTP/2 transport shared by every LLM provider call (Groq SDK and DeepSeek):
+# concurrent /enhance calls multiplex over kept-alive connections
+http_client = httpx.Client(
+    http2=True,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30.0),
+    timeout=httpx.Timeout(60.0, connect=5.0)
+)
+
+# Pooled session for Auth0 calls so logins reuse kept-alive connections.
+# Only idempotent requests are retried on gateway errors; the token exchange POST is never replayed.
+http_session = requests.Session()
+http_session.mount('https://', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=20,
+    max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=(502, 503, 504), raise_on_status=False)
+))
+
+# Shared Groq client, built once so concurrent /enhance calls reuse its connection pool
+groq_client = groq.Client(
+    api_key=GROQ_API_KEY,
+    http_client=http_client,
+    default_headers={
+        "Groq-Model-Version": "latest"  # Use latest compound model features
+    }
+) if GROQ_API_KEY else None
+
+# Prompt optimizer instructions, one per supported prompt type
+USER_PROMPT_OPTIMIZER = """You are an expert prompt engineer. Your task is to enhance user prompts to make them more effective, specific, and detailed. 
+Make the prompt clearer, add relevant context, improve structure, and ensure it will get better results from AI models.
+
+IMPORTANT INSTRUCTION: Return ONLY the enhanced prompt text itself with absolutely no prefixes, explanations, or commentary.
+DO NOT include phrases like "Here is the enhanced prompt:" or "Enhanced prompt:".
+DO NOT use quotation marks around the prompt.
+DO NOT explain what you did.
+DO NOT add any text before or after the enhanced prompt.
+Your entire response should be ONLY the enhanced prompt that the user can directly copy and paste."""
+
+IMAGE_PROMPT_OPTIMIZER = """You are an expert image generation prompt engineer specializing in AI image generation models like DALL-E, Midjourney, Stable Diffusion, and others.
+
+Your task is to convert the provided template-based image generation prompt into a comprehensive, well-structured JSON format that can be easily used with any image generation AI.
+
+CRITICAL REQUIREMENTS:
+1. Return ONLY valid JSON - no explanations, no prefixes, no commentary
+2. Structure the JSON with clear categories and subcategories
+3. Convert all [option1/option2/option3] brackets into "options" arrays
+4. Make the JSON comprehensive but clean
+5. Include a "final_prompt" field with a natural language summary
+
+JSON Structure should include:
+{
+  "prompt_type": "image_generation",
+  "category": "portrait/landscape/product/etc",
+  "parameters": {
+    "subject": {...},
+    "style": {...},
+    "lighting": {...},
+    "composition": {...},
+    "technical": {...}
+  },
+  "options": {
+    "style_options": [...],
+    "mood_options": [...],
+    "technical_options": [...]
+  },
+  "final_prompt": "A natural language description combining all elements"
+}
+
+Your entire response must be valid JSON that can be parsed directly."""
+
+SYSTEM_PROMPT_OPTIMIZER = """You are an expert prompt engineer. Your task is to enhance system prompts that are used to control AI assistant behavior.
+Improve the clarity, specificity, and effectiveness of the system prompt. Make it more detailed, address edge cases, and ensure consistent behavior.
+
+IMPORTANT INSTRUCTION: Return ONLY the enhanced prompt text itself with absolutely no prefixes, explanations, or commentary.
+DO NOT include phrases like "Here is the enhanced prompt:" or "Enhanced prompt:".
+DO NOT use quotation marks around the prompt.
+DO NOT explain what you did.
+DO NOT add any text before or after the enhanced prompt.
+Your entire response should be ONLY the enhanced prompt that the user can directly copy and paste."""
+
+# Prebuilt system messages so /enhance only has to add the user turn
+SYSTEM_MESSAGES = {
+    'user': {"role": "system", "content": USER_PROMPT_OPTIMIZER},
+    'image': {"role": "system", "content": IMAGE_PROMPT_OPTIMIZER},
+    'system': {"role": "system", "content": SYSTEM_PROMPT_OPTIMIZER},
+}
+
+# Longest prompt accepted (about 10k tokens); larger bodies are rejected before any API call
+MAX_PROMPT_CHARS = int(os.environ.get('MAX_PROMPT_CHARS', 40000))
+
+# Most prompts one /enhance call may batch; they are enhanced concurrently on this pool.
+# It is sized so every gunicorn thread in the worker (see Procfile) can run a full batch at once
+# instead of queueing behind another request's batch; threads are only started as needed.
+MAX_BATCH_PROMPTS = 8
+GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS', 8))
+batch_executor = ThreadPoolExecutor(max_workers=GUNICORN_THREADS * MAX_BATCH_PROMPTS)
+
+# Refuse request bodies that cannot hold a valid prompt before reading or parsing them
+# (up to 4 UTF-8 bytes per character, plus room for the rest of the JSON)
+app.config['MAX_CONTENT_LENGTH'] = MAX_PROMPT_CHARS * 4 + 4096
+
+@app.errorhandler(413)
+def request_too_large(e):
+    # /enhance also takes batches, whose prompts can each be valid yet together exceed the body cap
+    if request.endpoint == 'enhance_prompt':
+        return jsonify({"error": f"Request is too large (maximum {app.config['MAX_CONTENT_LENGTH']} bytes). Each prompt may be up to {MAX_PROMPT_CHARS} characters; split large batches into smaller requests"}), 413
+    return jsonify({"error": f"Prompt is too long (maximum {MAX_PROMPT_CHARS} characters)"}), 413
+
+# Completion budget bounds; enhancements expand the input, so the floor leaves room for that
+MIN_OUTPUT_TOKENS = 1024
+MAX_OUTPUT_TOKENS = 4096
+
+def max_output_tokens(input_prompt):
+    """Scale max_tokens with the prompt size (roughly 4 characters per token)"""
+    estimated_input_tokens = len(input_prompt) // 4
+    return max(MIN_OUTPUT_TOKENS, min(MAX_OUTPUT_TOKENS, estimated_input_tokens * 2 + 200))
+
+# Cache of finished enhancements keyed by prompt type and text. With Redis it is shared
+# by every gunicorn worker and survives restarts; without it each process keeps its own.
+ENHANCE_CACHE_TTL = 3600  # seconds
+if redis_url:
+    # The prefix is versioned so entries stored under an older key or value scheme are never read back
+    enhance_cache = RedisCache(host=redis_client, key_prefix='10x_prompt:enhance:v3:', default_timeout=ENHANCE_CACHE_TTL)
+else:
+    enhance_cache = SimpleCache(threshold=1024, default_timeout=ENHANCE_CACHE_TTL)
+
+def enhance_cache_key(prompt_type, input_prompt):
+    """Cache key for an exact (already stripped) prompt; case and whitespace matter for code and YAML"""
+    # Hash so keys stay a fixed size however long the prompt is
+    digest = blake2b(input_prompt.encode(), digest_size=16).hexdigest()
+    return f"{prompt_type}:{digest}"
+
+def get_cached_enhancement(cache_key):
+    """Return the cached (enhanced_prompt, api_provider, api_model, token_count), or None on a miss"""
+    try:
+        return enhance_cache.get(cache_key)
+    except redis.RedisError as e:
+        # An unreachable cache should cost a cache miss, not the request
+        logger.warning("Enhancement cache lookup failed: %s", e)
+        return None
+
+def cache_enhancement(cache_key, enhanced_prompt, api_provider, api_model, token_count=None):
+    """Remember an API result so identical requests skip the round-trip"""
+    try:
+        enhance_cache.set(cache_key, (enhanced_prompt, api_provider, api_model, token_count))
+    except redis.RedisError as e:
+        logger.warning("Enhancement cache store failed: %s", e)
+
+# User-facing error responses
+INVALID_FORMAT_ERROR_RESPONSE = {
+    'error': 'The AI service returned an unexpected response format. This may be due to high demand or a temporary service issue.',
+    'details': 'Please try again in a moment, or try with a different prompt.',
+    'error_type': 'INVALID_RESPONSE_FORMAT'
+}
+TIMEOUT_ERROR_RESPONSE = {
+    'error': 'The request timed out. The AI service may be experiencing high demand.',
+    'details': 'Please try again in a moment.',
+    'error_type': 'TIMEOUT_ERROR'
+}
+RATE_LIMIT_ERROR_RESPONSE = {
+    'error': 'Rate limit exceeded. Please wait a moment before trying again.',
+    'details': 'The AI service has temporary usage limits.',
+    'error_type': 'RATE_LIMIT_ERROR'
+}
+GENERAL_ERROR_RESPONSE = {
+    'error': 'Failed to enhance prompt due to an unexpected error.',
+    'details': 'Please try again or contact support if the issue persists.',
+    'error_type': 'GENERAL_ERROR'
+}
+
+# Exception classes that already tell us what went wrong, checked before any message scanning
+ERROR_TYPES = (
+    ((groq.APITimeoutError, httpx.TimeoutException), TIMEOUT_ERROR_RESPONSE),
+    ((groq.RateLimitError,), RATE_LIMIT_ERROR_RESPONSE),
+)
+
+# Fallback for untyped errors: case-insensitive patterns matched against the message in order
+ERROR_MESSAGES = (
+    (re.compile(r"unexpected token '<'|html", re.IGNORECASE), INVALID_FORMAT_ERROR_RESPONSE),
+    (re.compile(r"timeout|timed out", re.IGNORECASE), TIMEOUT_ERROR_RESPONSE),
+    (re.compile(r"rate limit", re.IGNORECASE), RATE_LIMIT_ERROR_RESPONSE),
+)
+
+def classify_error(error):
+    """Map an exception to a user-facing error response"""
+    for error_types, response in ERROR_TYPES:
+        if isinstance(error, error_types):
+            return response
+    message = str(error)
+    for pattern, response in ERROR_MESSAGES:
+        if pattern.search(message):
+            return response
+    return GENERAL_ERROR_RESPONSE
 
 # Authentication decorator
 def requires_auth(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        # Debug session info
-        logger.info(f"Auth check for path: {request.path}")
-        logger.info(f"Current session data: {dict(session)}")
-        session_id = request.cookies.get(app.config['SESSION_COOKIE_NAME'])
-        logger.info(f"Session ID: {session_id or 'None'}")
-        
-        # Detailed check for authentication status
-        has_profile = 'profile' in session
-        has_user_id = has_profile and session.get('profile', {}).get('user_id')
-        
-        if not has_profile:
-            logger.warning("No profile in session, redirecting to login")
-            return redirect(url_for('login_page'))
+        # The session is already loaded and signature-checked, so one lookup is enough
+        profile = session.get('profile')
         
-        if not has_user_id:
-            logger.warning("Invalid profile data in session (missing user_id), clearing session")
+        if not profile or not profile.get('user_id'):
+            logger.warning("No valid profile in session, clearing session and redirecting to login")
             session.clear()
-            session.modified = True
             return redirect(url_for('login_page'))
         
-        # Log authentication success
-        logger.info(f"Auth successful for user: {session['profile'].get('name', 'Unknown')}")
-        
-        # Ensure session is marked as modified to prevent getting lost
-        session.modified = True
-        
         return f(*args, **kwargs)
     return decorated
 
+def render_index(profile):
+    """Render the main page and return it with its ETag"""
+    html = render_template('index.html', profile=profile)
+    return html, blake2b(html.encode(), digest_size=16).hexdigest()
+
+@lru_cache(maxsize=256)
+def cached_index(name, picture):
+    """The main page only varies by the profile name and picture, so it is rendered once per user"""
+    return render_index({'name': name, 'picture': picture})
+
 @app.route('/')
 @requires_auth
 def index():
     # User is authenticated (ensured by @requires_auth)
-    response = make_response(render_template('index.html', profile=session.get('profile', {})))
-    # Ensure proper cache headers
-    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
-    return response
+    profile = session['profile']
+    if app.debug:
+        # Skip the cache so template edits show up while developing
+        html, etag = render_index(profile)
+    else:
+        html, etag = cached_index(profile.get('name'), profile.get('picture'))
+    response = make_response(html)
+    # Browsers must revalidate every load (so logged-out users are redirected), but an
+    # unchanged page is answered with an empty 304
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
 
 @app.route('/login')
 def login_page():
     # Log the request to the login page
-    logger.info("User accessing login page")
-    logger.info(f"Session state: {dict(session)}")
+    profile = session.get('profile') or {}
+    logger.debug("Login page requested (user_id=%s)", profile.get('user_id'))
     
     # If user is already logged in, redirect to the main application
-    if 'profile' in session and session.get('profile', {}).get('user_id'):
-        logger.info(f"User already authenticated: {session['profile'].get('name', 'Unknown')}")
+    if profile.get('user_id'):
+        logger.info("User already authenticated: %s", profile.get('name', 'Unknown'))
         return redirect(url_for('index'))
     
     # Display login page for unauthenticated users
@@ -148,10 +388,10 @@ def login_with_auth0():
     try:
         # Log detailed auth0 configuration for debugging
         logger.info("Auth0 login attempt - checking configuration")
-        logger.info(f"AUTH0_DOMAIN: {AUTH0_DOMAIN or 'Not set'}")
-        logger.info(f"AUTH0_CLIENT_ID: {'Set' if AUTH0_CLIENT_ID else 'Not set'}")
-        logger.info(f"AUTH0_CLIENT_SECRET: {'Set' if AUTH0_CLIENT_SECRET else 'Not set'}")
-        logger.info(f"AUTH0_CALLBACK_URL: {AUTH0_CALLBACK_URL or 'Not set'}")
+        logger.info("AUTH0_DOMAIN: %s", AUTH0_DOMAIN or 'Not set')
+        logger.info("AUTH0_CLIENT_ID: %s", 'Set' if AUTH0_CLIENT_ID else 'Not set')
+        logger.info("AUTH0_CLIENT_SECRET: %s", 'Set' if AUTH0_CLIENT_SECRET else 'Not set')
+        logger.info("AUTH0_CALLBACK_URL: %s", AUTH0_CALLBACK_URL or 'Not set')
         
         # Check if Auth0 is properly configured
         if not AUTH0_DOMAIN:
@@ -171,10 +411,9 @@ def login_with_auth0():
         
         # Store the nonce in the session
         session['auth0_nonce'] = nonce
-        session.modified = True
         
         # Use the callback URL from environment variables
-        logger.info(f"Using callback URL: {AUTH0_CALLBACK_URL}")
+        logger.info("Using callback URL: %s", AUTH0_CALLBACK_URL)
         
         # Construct the Auth0 authorization URL
         params = {
@@ -191,20 +430,38 @@ def login_with_auth0():
             params['audience'] = AUTH0_AUDIENCE
         
         # Log the authorization attempt
-        logger.info(f"Redirecting to Auth0 for authentication with nonce: {nonce}")
+        logger.info("Redirecting to Auth0 for authentication with nonce: %s", nonce)
         
         # Construct the Auth0 URL
-        auth_url = f'https://{AUTH0_DOMAIN}/authorize?' + urlencode(params)
-        logger.info(f"Auth0 URL: {auth_url}")
+        auth_url = f'{AUTH0_AUTHORIZE_URL}?' + urlencode(params)
+        logger.info("Auth0 URL: %s", auth_url)
         
         # Redirect the user to Auth0 for authentication
         return redirect(auth_url)
         
     except Exception as e:
-        logger.error(f"Error in Auth0 authentication flow: {str(e)}")
+        logger.error("Error in Auth0 authentication flow: %s", e)
         logger.error(traceback.format_exc())
         return render_template('login.html', error=f"Authentication error: {str(e)}")
 
+def id_token_claims(id_token, nonce):
+    """Return the profile claims of an Auth0 ID token, or None if /userinfo should be used instead.
+
+    The token comes straight from Auth0's token endpoint over TLS in exchange for our
+    client secret, so its signature is not re-verified (OpenID Connect Core 3.1.3.7).
+    """
+    if not id_token:
+        return None
+    try:
+        claims = jwt.get_unverified_claims(id_token)
+    except JWTError as e:
+        logger.warning("Could not decode ID token, falling back to /userinfo: %s", e)
+        return None
+    # Only trust tokens issued for this login and this application
+    if claims.get('nonce') != nonce or claims.get('aud') != AUTH0_CLIENT_ID or 'name' not in claims:
+        return None
+    return claims
+
 @app.route('/callback')
 def callback():
     # This route handles the callback from Auth0
@@ -226,7 +483,6 @@ def callback():
             return render_template('login.html', error="Authentication service configuration error: Missing callback URL")
         
         # Exchange the authorization code for tokens
-        token_url = f'https://{AUTH0_DOMAIN}/oauth/token'
         token_payload = {
             'grant_type': 'authorization_code',
             'client_id': AUTH0_CLIENT_ID,
@@ -235,45 +491,50 @@ def callback():
             'redirect_uri': AUTH0_CALLBACK_URL
         }
         
-        logger.info(f"Exchanging code for tokens with callback URL: {AUTH0_CALLBACK_URL}")
+        logger.info("Exchanging code for tokens with callback URL: %s", AUTH0_CALLBACK_URL)
         
         # Make the token exchange request
-        token_response = requests.post(token_url, json=token_payload)
+        token_response = http_session.post(AUTH0_TOKEN_URL, json=token_payload, timeout=10)
         
         # Check if token exchange was successful
         if token_response.status_code != 200:
-            logger.error(f"Failed to exchange code for tokens: {token_response.text}")
+            logger.error("Failed to exchange code for tokens: %.1000s", token_response.text)
             return render_template('login.html', error="Failed to complete authentication. Please try again.")
         
         # Extract tokens from the response
-        tokens = token_response.json()
+        tokens = orjson.loads(token_response.content)
         access_token = tokens.get('access_token')
         
         if not access_token:
             logger.error("No access token received from Auth0")
             return render_template('login.html', error="Authentication failed. No access token received.")
         
-        # Use the access token to get user information
-        user_info_url = f'https://{AUTH0_DOMAIN}/userinfo'
-        user_info_response = requests.get(
-            user_info_url,
-            headers={'Authorization': f'Bearer {access_token}'}
-        )
-        
-        # Check if user info request was successful
-        if user_info_response.status_code != 200:
-            logger.error(f"Failed to get user info: {user_info_response.text}")
-            return render_template('login.html', error="Failed to retrieve user information.")
+        # The ID token already carries the profile claims, which saves a /userinfo round-trip
+        user_info = id_token_claims(tokens.get('id_token'), session.get('auth0_nonce'))
         
-        # Extract user information
-        user_info = user_info_response.json()
+        if not user_info:
+            # Use the access token to get user information
+            user_info_response = http_session.get(
+                AUTH0_USERINFO_URL,
+                headers={'Authorization': f'Bearer {access_token}'},
+                timeout=10
+            )
+            
+            # Check if user info request was successful
+            if user_info_response.status_code != 200:
+                logger.error("Failed to get user info: %.1000s", user_info_response.text)
+                return render_template('login.html', error="Failed to retrieve user information.")
+            
+            # Extract user information
+            user_info = orjson.loads(user_info_response.content)
         
         # Ensure we have a user_id
         if not user_info.get('sub'):
             logger.error("No user ID (sub) in user info response")
             return render_template('login.html', error="User identification failed.")
         
-        # Store user information in the session
+        # Store user information in the session; the login nonce is no longer needed
+        session.pop('auth0_nonce', None)
         session['profile'] = {
             'user_id': user_info.get('sub'),
             'name': user_info.get('name', 'Unknown'),
@@ -282,17 +543,14 @@ def callback():
             'login_time': datetime.now().isoformat()
         }
         
-        # Force session to be saved
-        session.modified = True
-        
         # Log successful authentication
-        logger.info(f"User authenticated successfully: {user_info.get('name')}")
+        logger.info("User authenticated successfully: %s", user_info.get('name'))
         
         # Redirect to the main application
         return redirect(url_for('index'))
         
     except Exception as e:
-        logger.error(f"Error in Auth0 callback: {str(e)}")
+        logger.error("Error in Auth0 callback: %s", e)
         logger.error(traceback.format_exc())
         return render_template('login.html', error="Authentication error. Please try again later.")
 
@@ -305,11 +563,8 @@ def logout():
     # Clear user session completely
     session.clear()
     
-    # Ensure session is marked as modified
-    session.modified = True
-    
     # Log the logout action with user details
-    logger.info(f"User logged out: {user_name} (Session ID: {session_id})")
+    logger.info("User logged out: %s (Session ID: %s)", user_name, session_id)
     
     # Get the Auth0 domain
     if not AUTH0_DOMAIN or not AUTH0_CLIENT_ID:
@@ -321,411 +576,600 @@ def logout():
         'returnTo': 'https://tenx-prompt-25322b7d0675.herokuapp.com/login',
         'client_id': AUTH0_CLIENT_ID
     }
-    logout_url = f'https://{AUTH0_DOMAIN}/v2/logout?' + urlencode(params)
+    logout_url = f'{AUTH0_LOGOUT_URL}?' + urlencode(params)
     
     # Log the logout URL
-    logger.info(f"Redirecting to Auth0 logout: {logout_url}")
+    logger.info("Redirecting to Auth0 logout: %s", logout_url)
     
     # Redirect to Auth0 logout endpoint
     return redirect(logout_url)
 
-@app.route('/enhance', methods=['POST'])
-@requires_auth
-def enhance_prompt():
-    """Enhance a prompt using the selected API"""
-    try:
-        # Check session again inside the route
-        if 'profile' not in session or not session.get('profile', {}).get('user_id'):
-            logger.warning("Session lost between auth decorator and route function")
-            return jsonify({"error": "Authentication required", "code": "SESSION_LOST"}), 401
+def local_enhance(prompt, prompt_type):
+    """Rule-based enhancement used when every API is unavailable"""
+    if prompt_type == 'user':
+        # Simple enhancement rules for user prompts
+        enhanced = prompt
         
-        # Force session save at the beginning of the request
-        session.modified = True
+        # Add specificity and detail
+        if not any(word in prompt.lower() for word in ['specific', 'detailed', 'in-depth']):
+            enhanced = f"Provide a detailed and specific response about: {enhanced}"
         
-        # Extract data from request
-        data = request.get_json()
+        # Add output format if none specified
+        if not any(word in prompt.lower() for word in ['format', 'structure', 'organize']):
+            enhanced += "\n\nStructure your response with clear sections and bullet points where appropriate."
         
-        if not data:
-            return jsonify({"error": "No JSON data provided"}), 400
+        # Add clarity request
+        if not any(word in prompt.lower() for word in ['clear', 'easy to understand', 'simple language']):
+            enhanced += "\n\nUse clear language and explain any technical terms."
             
-        input_prompt = data.get('prompt', '').strip()
-        prompt_type = data.get('type', 'user').lower()  # Default to user prompt
+        return enhanced
         
-        if not input_prompt:
-            return jsonify({"error": "No prompt provided"}), 400
-            
-        # Log the user making the request
-        logger.info(f"Enhancement requested by: {session['profile'].get('name')} (User ID: {session['profile'].get('user_id')})")
+    else:  # system prompt
+        # Simple enhancement rules for system prompts
+        enhanced = prompt
         
-        # Get start time for performance measurement
-        start_time = time.time()
+        # Add edge case handling
+        if not any(word in prompt.lower() for word in ['edge case', 'exception', 'special case']):
+            enhanced += "\n\nHandle edge cases and make reasonable assumptions when information is ambiguous."
         
-        # Prepare the enhancement request based on prompt type
-        if prompt_type == 'user':
-            system_message = """You are an expert prompt engineer. Your task is to enhance user prompts to make them more effective, specific, and detailed. 
-            Make the prompt clearer, add relevant context, improve structure, and ensure it will get better results from AI models.
-            
-            IMPORTANT INSTRUCTION: Return ONLY the enhanced prompt text itself with absolutely no prefixes, explanations, or commentary.
-            DO NOT include phrases like "Here is the enhanced prompt:" or "Enhanced prompt:".
-            DO NOT use quotation marks around the prompt.
-            DO NOT explain what you did.
-            DO NOT add any text before or after the enhanced prompt.
-            Your entire response should be ONLY the enhanced prompt that the user can directly copy and paste."""
-        elif prompt_type == 'image':
-            system_message = """You are an expert image generation prompt engineer specializing in AI image generation models like DALL-E, Midjourney, Stable Diffusion, and others.
-
-            Your task is to convert the provided template-based image generation prompt into a comprehensive, well-structured JSON format that can be easily used with any image generation AI.
-
-            CRITICAL REQUIREMENTS:
-            1. Return ONLY valid JSON - no explanations, no prefixes, no commentary
-            2. Structure the JSON with clear categories and subcategories
-            3. Convert all [option1/option2/option3] brackets into "options" arrays
-            4. Make the JSON comprehensive but clean
-            5. Include a "final_prompt" field with a natural language summary
+        # Add consistency requirement
+        if not any(word in prompt.lower() for word in ['consistent', 'coherent', 'maintain']):
+            enhanced += "\n\nMaintain consistent behavior and tone throughout all interactions."
             
-            JSON Structure should include:
-            {
-              "prompt_type": "image_generation",
-              "category": "portrait/landscape/product/etc",
-              "parameters": {
-                "subject": {...},
-                "style": {...},
-                "lighting": {...},
-                "composition": {...},
-                "technical": {...}
-              },
-              "options": {
-                "style_options": [...],
-                "mood_options": [...],
-                "technical_options": [...]
-              },
-              "final_prompt": "A natural language description combining all elements"
-            }
-            
-            Your entire response must be valid JSON that can be parsed directly."""
-        else:  # system prompt
-            system_message = """You are an expert prompt engineer. Your task is to enhance system prompts that are used to control AI assistant behavior.
-            Improve the clarity, specificity, and effectiveness of the system prompt. Make it more detailed, address edge cases, and ensure consistent behavior.
-            
-            IMPORTANT INSTRUCTION: Return ONLY the enhanced prompt text itself with absolutely no prefixes, explanations, or commentary.
-            DO NOT include phrases like "Here is the enhanced prompt:" or "Enhanced prompt:".
-            DO NOT use quotation marks around the prompt.
-            DO NOT explain what you did.
-            DO NOT add any text before or after the enhanced prompt.
-            Your entire response should be ONLY the enhanced prompt that the user can directly copy and paste."""
-        
-        # Try to use Groq API first
-        groq_api_key = os.environ.get('GROQ_API_KEY')
-        enhanced_prompt = None
-        api_provider = None
-        api_model = None
-        error_message = None
-        
-        if groq_api_key:
-            try:
-                # Initialize Groq client with latest model version
-                import groq
-                client = groq.Client(
-                    api_key=groq_api_key,
-                    default_headers={
-                        "Groq-Model-Version": "latest"  # Use latest compound model features
-                    }
-                )
-                
-                # Make the API call using the Groq SDK with compound model
-                chat_completion = client.chat.completions.create(
-                    model="groq/compound",
-                    messages=[
-                        {"role": "system", "content": system_message},
-                        {"role": "user", "content": input_prompt}
-                    ],
-                    temperature=0.7,
-                    max_tokens=4096
-                )
-                
-                # Extract the enhanced prompt
-                enhanced_prompt = chat_completion.choices[0].message.content.strip()
-                api_provider = "Groq"
-                api_model = "groq/compound"
-                
-                # Log if compound model used built-in tools (web search, code execution, etc.)
-                if hasattr(chat_completion.choices[0].message, 'executed_tools'):
-                    executed_tools = chat_completion.choices[0].message.executed_tools
-                    if executed_tools:
-                        logger.info(f"Compound model executed {len(executed_tools)} tool(s)")
-                
-            except Exception as groq_err:
-                logger.warning(f"Groq API error, will try fallback: {str(groq_err)}")
-                error_message = str(groq_err)
-        else:
-            logger.warning("Groq API key not found, will try fallback")
-        
-        # Fallback to DeepSeek API if Groq failed or wasn't available
-        if not enhanced_prompt:
-            deepseek_api_key = os.environ.get('DEEPSEEK_API_KEY')
-            deepseek_api_url = os.environ.get('API_URL', 'https://api.deepseek.com/v1')
+        return enhanced
+
+def complete_with_groq(messages, max_tokens):
+    """Return the text and completion token count of a buffered Groq completion"""
+    # Make the API call using the Groq SDK with compound model
+    chat_completion = groq_client.chat.completions.create(
+        model=GROQ_MODEL,
+        messages=messages,
+        temperature=0.7,
+        max_tokens=max_tokens
+    )
+    message = chat_completion.choices[0].message
+    
+    # Log if compound model used built-in tools (web search, code execution, etc.)
+    executed_tools = getattr(message, 'executed_tools', None)
+    if executed_tools:
+        logger.debug("Compound model executed %d tool(s)", len(executed_tools))
+    
+    return message.content.strip(), chat_completion.usage.completion_tokens if chat_completion.usage else None
+
+def complete_with_deepseek(messages, max_tokens):
+    """Return the text and completion token count of a buffered DeepSeek completion"""
+    response = http_client.post(
+        DEEPSEEK_CHAT_URL,
+        headers=DEEPSEEK_HEADERS,
+        content=orjson.dumps({
+            "model": DEEPSEEK_MODEL,
+            "messages": messages,
+            "temperature": 0.7,
+            "max_tokens": max_tokens
+        }),
+        timeout=httpx.Timeout(30.0, connect=5.0)
+    )
+    response.raise_for_status()
+    response_data = orjson.loads(response.content)
+    content = response_data.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
+    return content, (response_data.get("usage") or {}).get("completion_tokens")
+
+def configured_providers(streaming=False):
+    """List (api_provider, api_model, call) for each configured API in fallback order.
+
+    call(messages, max_tokens) returns (text, completion_tokens); when streaming it yields text
+    deltas and returns completion_tokens.
+    """
+    providers = []
+    if groq_client:
+        providers.append(("Groq", GROQ_MODEL, stream_groq_enhancement if streaming else complete_with_groq))
+    if DEEPSEEK_API_KEY:
+        providers.append(("DeepSeek", DEEPSEEK_MODEL, stream_deepseek_enhancement if streaming else complete_with_deepseek))
+    return providers
+
+def generate_enhancement(messages, input_prompt, prompt_type):
+    """Run the prompt through each configured API in order, then the local rules.
+
+    Returns (enhanced_prompt, api_provider, api_model, token_count, error_message); token_count is
+    the provider's completion token count, or None when it did not report one.
+    """
+    errors = []
+    max_tokens = max_output_tokens(input_prompt)
+    
+    for api_provider, api_model, complete in configured_providers():
+        try:
+            enhanced_prompt, token_count = complete(messages, max_tokens)
+        except Exception as api_err:
+            logger.warning("%s API error, will try fallback: %s", api_provider, api_err)
+            errors.append(f"{api_provider} error: {api_err}")
+            continue
+        if enhanced_prompt:
+            return enhanced_prompt, api_provider, api_model, token_count, None
+    
+    # Last resort: Local enhancement (for resilience when APIs are down/rate limited)
+    logger.warning("All API calls failed, using local enhancement as last resort")
+    return local_enhance(input_prompt, prompt_type), "Local", "Rule-based", None, "; ".join(errors) or None
+
+def clean_enhanced_prompt(enhanced_prompt, prompt_type):
+    """Strip think tags, prefixes, quotes and code fences from a model response"""
+    # Post-process to remove common prefixes, explanations, and think tags
+    # Remove complete <think>...</think> blocks (case insensitive, multiline)
+    think_pattern = r'<think>.*?</think>'
+    enhanced_prompt = re.sub(think_pattern, '', enhanced_prompt, flags=re.DOTALL | re.IGNORECASE)
+    
+    # Handle incomplete <think> tags by removing everything from <think> to the end
+    # This is a simple and safe approach for the most common case
+    if '<think>' in enhanced_prompt.lower():
+        # Find the position of <think> and remove everything from there
+        think_pos = enhanced_prompt.lower().find('<think>')
+        if think_pos != -1:
+            enhanced_prompt = enhanced_prompt[:think_pos]
+    
+    # Remove any remaining standalone <think> or </think> tags
+    enhanced_prompt = re.sub(r'</?think>', '', enhanced_prompt, flags=re.IGNORECASE)
+    
+    # Clean up extra whitespace that might be left after removing think tags
+    enhanced_prompt = re.sub(r'\n\s*\n\s*\n', '\n\n', enhanced_prompt)  # Replace multiple newlines with double
+    enhanced_prompt = enhanced_prompt.strip()
+    
+    # List of prefixes to remove
+    prefixes_to_remove = [
+        "Here is the enhanced prompt:", "Enhanced prompt:", "Here's the enhanced prompt:",
+        "Here is your enhanced prompt:", "The enhanced prompt is:", "Enhanced version:",
+        "Here's your enhanced prompt:", "Improved prompt:", "Enhanced:", "Here you go:",
+        "Here is an enhanced version:", "Here's an enhanced version:", "Enhanced user prompt:",
+        "Enhanced system prompt:", "Improved version:", "Here's the improved prompt:",
+        "Here is the improved prompt:"
+    ]
+    
+    # Remove any of these prefixes (case insensitive)
+    for prefix in prefixes_to_remove:
+        if enhanced_prompt.lower().startswith(prefix.lower()):
+            # Remove the prefix and any whitespace after it
+            enhanced_prompt = enhanced_prompt[len(prefix):].lstrip()
+            logger.debug("Removed prefix: '%s' from response", prefix)
             
-            if deepseek_api_key:
-                try:
-                    # Make API request to DeepSeek
-                    headers = {
-                        "Authorization": f"Bearer {deepseek_api_key}",
-                        "Content-Type": "application/json"
-                    }
-                    
-                    payload = {
-                        "model": "deepseek-chat",
-                        "messages": [
-                            {"role": "system", "content": system_message},
-                            {"role": "user", "content": input_prompt}
-                        ],
-                        "temperature": 0.7,
-                        "max_tokens": 4096
-                    }
-                    
-                    response = requests.post(
-                        f"{deepseek_api_url}/chat/completions",
-                        headers=headers,
-                        json=payload,
-                        timeout=30
-                    )
-                    
-                    response.raise_for_status()
-                    response_data = response.json()
-                    
-                    # Extract the enhanced prompt from the response
-                    enhanced_prompt = response_data.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
-                    api_provider = "DeepSeek"
-                    api_model = "deepseek-chat"
-                    
-                except Exception as deepseek_err:
-                    logger.warning(f"DeepSeek API error, will try local enhancement: {str(deepseek_err)}")
-                    if error_message:
-                        error_message += f"; DeepSeek error: {str(deepseek_err)}"
-                    else:
-                        error_message = f"DeepSeek error: {str(deepseek_err)}"
-            else:
-                logger.warning("DeepSeek API key not found, will try local enhancement")
-                if error_message:
-                    error_message += "; DeepSeek API key not found"
-                else:
-                    error_message = "DeepSeek API key not found"
-        
-        # Last resort: Local enhancement (for resilience when APIs are down/rate limited)
-        if not enhanced_prompt:
-            logger.warning("All API calls failed, using local enhancement as last resort")
+    # More advanced regex-based cleanup for prefixes followed by newlines or colons
+    # Try to detect and remove intro sentences that end with a colon followed by text
+    intro_pattern = r'^([^:]{5,100}?:)(\s+)(.+)$'
+    intro_match = re.match(intro_pattern, enhanced_prompt, re.DOTALL)
+    if intro_match:
+        # Check if the first part looks like an introduction
+        intro = intro_match.group(1).lower()
+        if any(keyword in intro for keyword in ['enhance', 'improve', 'here', 'prompt', 'version']):
+            enhanced_prompt = intro_match.group(3)
+            logger.debug("Removed intro with regex: '%s'", intro_match.group(1))
+
+    # Remove surrounding quotes if present (single, double, or triple quotes)
+    if (enhanced_prompt.startswith('"') and enhanced_prompt.endswith('"')) or \
+       (enhanced_prompt.startswith("'") and enhanced_prompt.endswith("'")) or \
+       (enhanced_prompt.startswith('"""') and enhanced_prompt.endswith('"""')) or \
+       (enhanced_prompt.startswith("'''") and enhanced_prompt.endswith("'''")):
+        # Count the quote characters at the start and end
+        start_quotes = len(re.match(r'^[\'"]++', enhanced_prompt).group(0))
+        end_quotes = len(re.match(r'[\'"]++$', enhanced_prompt[::-1]).group(0))
+        enhanced_prompt = enhanced_prompt[start_quotes:-end_quotes]
+        logger.debug("Removed %d opening and %d closing quotes", start_quotes, end_quotes)
+        
+    # Remove "```" code blocks that might wrap the response
+    if enhanced_prompt.startswith("```") and "```" in enhanced_prompt[3:]:
+        # Extract content between first ``` and last ```
+        first_marker = enhanced_prompt.find("```")
+        last_marker = enhanced_prompt.rfind("```")
+        
+        # Check if we have actual content between the markers
+        if last_marker > first_marker + 3:
+            content_start = enhanced_prompt.find("\n", first_marker) + 1
+            if content_start > 0 and content_start < last_marker:
+                enhanced_prompt = enhanced_prompt[content_start:last_marker].strip()
+                logger.debug("Removed code block markers from response")
+    
+    # Strip any leading/trailing whitespace once more after all processing
+    enhanced_prompt = enhanced_prompt.strip()
+    
+    # For image prompts, validate JSON format
+    if prompt_type == 'image':
+        try:
+            # Try to parse as JSON to validate
+            json_data = orjson.loads(enhanced_prompt)
             
-            # Create a basic enhancement function
-            def local_enhance(prompt, prompt_type):
-                if prompt_type == 'user':
-                    # Simple enhancement rules for user prompts
-                    enhanced = prompt
-                    
-                    # Add specificity and detail
-                    if not any(word in prompt.lower() for word in ['specific', 'detailed', 'in-depth']):
-                        enhanced = f"Provide a detailed and specific response about: {enhanced}"
-                    
-                    # Add output format if none specified
-                    if not any(word in prompt.lower() for word in ['format', 'structure', 'organize']):
-                        enhanced += "\n\nStructure your response with clear sections and bullet points where appropriate."
-                    
-                    # Add clarity request
-                    if not any(word in prompt.lower() for word in ['clear', 'easy to understand', 'simple language']):
-                        enhanced += "\n\nUse clear language and explain any technical terms."
-                        
-                    return enhanced
-                    
-                else:  # system prompt
-                    # Simple enhancement rules for system prompts
-                    enhanced = prompt
-                    
-                    # Add edge case handling
-                    if not any(word in prompt.lower() for word in ['edge case', 'exception', 'special case']):
-                        enhanced += "\n\nHandle edge cases and make reasonable assumptions when information is ambiguous."
-                    
-                    # Add consistency requirement
-                    if not any(word in prompt.lower() for word in ['consistent', 'coherent', 'maintain']):
-                        enhanced += "\n\nMaintain consistent behavior and tone throughout all interactions."
-                        
-                    return enhanced
+            # Ensure it has required fields
+            if not isinstance(json_data, dict):
+                raise ValueError("Response is not a valid JSON object")
             
-            # Apply the local enhancement
-            enhanced_prompt = local_enhance(input_prompt, prompt_type)
-            api_provider = "Local"
-            api_model = "Rule-based"
+            # Add some basic validation
+            if 'prompt_type' not in json_data:
+                json_data['prompt_type'] = 'image_generation'
             
-            # Log that we used the local enhancement
-            logger.info("Used local enhancement method as fallback")
-        
-        if not enhanced_prompt:
-            logger.error("All enhancement methods failed")
-            error_msg = "Failed to enhance prompt (all methods failed)"
-            if error_message:
-                error_msg += f": {error_message}"
-            return jsonify({"error": error_msg}), 500
-        
-        # Post-process to remove common prefixes, explanations, and think tags
-        # Remove complete <think>...</think> blocks (case insensitive, multiline)
-        think_pattern = r'<think>.*?</think>'
-        enhanced_prompt = re.sub(think_pattern, '', enhanced_prompt, flags=re.DOTALL | re.IGNORECASE)
-        
-        # Handle incomplete <think> tags by removing everything from <think> to the end
-        # This is a simple and safe approach for the most common case
-        if '<think>' in enhanced_prompt.lower():
-            # Find the position of <think> and remove everything from there
-            think_pos = enhanced_prompt.lower().find('<think>')
-            if think_pos != -1:
-                enhanced_prompt = enhanced_prompt[:think_pos]
-        
-        # Remove any remaining standalone <think> or </think> tags
-        enhanced_prompt = re.sub(r'</?think>', '', enhanced_prompt, flags=re.IGNORECASE)
-        
-        # Clean up extra whitespace that might be left after removing think tags
-        enhanced_prompt = re.sub(r'\n\s*\n\s*\n', '\n\n', enhanced_prompt)  # Replace multiple newlines with double
-        enhanced_prompt = enhanced_prompt.strip()
-        
-        # List of prefixes to remove
-        prefixes_to_remove = [
-            "Here is the enhanced prompt:", "Enhanced prompt:", "Here's the enhanced prompt:",
-            "Here is your enhanced prompt:", "The enhanced prompt is:", "Enhanced version:",
-            "Here's your enhanced prompt:", "Improved prompt:", "Enhanced:", "Here you go:",
-            "Here is an enhanced version:", "Here's an enhanced version:", "Enhanced user prompt:",
-            "Enhanced system prompt:", "Improved version:", "Here's the improved prompt:",
-            "Here is the improved prompt:"
-        ]
-        
-        # Remove any of these prefixes (case insensitive)
-        for prefix in prefixes_to_remove:
-            if enhanced_prompt.lower().startswith(prefix.lower()):
-                # Remove the prefix and any whitespace after it
-                enhanced_prompt = enhanced_prompt[len(prefix):].lstrip()
-                logger.info(f"Removed prefix: '{prefix}' from response")
-                
-        # More advanced regex-based cleanup for prefixes followed by newlines or colons
-        # Try to detect and remove intro sentences that end with a colon followed by text
-        intro_pattern = r'^([^:]{5,100}?:)(\s+)(.+)$'
-        intro_match = re.match(intro_pattern, enhanced_prompt, re.DOTALL)
-        if intro_match:
-            # Check if the first part looks like an introduction
-            intro = intro_match.group(1).lower()
-            if any(keyword in intro for keyword in ['enhance', 'improve', 'here', 'prompt', 'version']):
-                enhanced_prompt = intro_match.group(3)
-                logger.info(f"Removed intro with regex: '{intro_match.group(1)}'")
-
-        # Remove surrounding quotes if present (single, double, or triple quotes)
-        if (enhanced_prompt.startswith('"') and enhanced_prompt.endswith('"')) or \
-           (enhanced_prompt.startswith("'") and enhanced_prompt.endswith("'")) or \
-           (enhanced_prompt.startswith('"""') and enhanced_prompt.endswith('"""')) or \
-           (enhanced_prompt.startswith("'''") and enhanced_prompt.endswith("'''")):
-            # Count the quote characters at the start and end
-            start_quotes = len(re.match(r'^[\'"]++', enhanced_prompt).group(0))
-            end_quotes = len(re.match(r'[\'"]++$', enhanced_prompt[::-1]).group(0))
-            enhanced_prompt = enhanced_prompt[start_quotes:-end_quotes]
-            logger.info(f"Removed {start_quotes} opening and {end_quotes} closing quotes")
+            # Re-serialize to ensure clean JSON
+            enhanced_prompt = orjson.dumps(json_data, option=orjson.OPT_INDENT_2).decode()
             
-        # Remove "```" code blocks that might wrap the response
-        if enhanced_prompt.startswith("```") and "```" in enhanced_prompt[3:]:
-            # Extract content between first ``` and last ```
-            first_marker = enhanced_prompt.find("```")
-            last_marker = enhanced_prompt.rfind("```")
+        except (orjson.JSONDecodeError, ValueError) as e:
+            logger.error("Invalid JSON response for image prompt: %s", e)
+            logger.error("Raw response: %.1000s", enhanced_prompt)
             
-            # Check if we have actual content between the markers
-            if last_marker > first_marker + 3:
-                content_start = enhanced_prompt.find("\n", first_marker) + 1
-                if content_start > 0 and content_start < last_marker:
-                    enhanced_prompt = enhanced_prompt[content_start:last_marker].strip()
-                    logger.info("Removed code block markers from response")
-        
-        # Strip any leading/trailing whitespace once more after all processing
-        enhanced_prompt = enhanced_prompt.strip()
-        
-        # For image prompts, validate JSON format
-        if prompt_type == 'image':
-            try:
-                # Try to parse as JSON to validate
-                import json
-                json_data = json.loads(enhanced_prompt)
-                
-                # Ensure it has required fields
-                if not isinstance(json_data, dict):
-                    raise ValueError("Response is not a valid JSON object")
-                
-                # Add some basic validation
-                if 'prompt_type' not in json_data:
-                    json_data['prompt_type'] = 'image_generation'
-                
-                # Re-serialize to ensure clean JSON
-                enhanced_prompt = json.dumps(json_data, indent=2, ensure_ascii=False)
-                
-            except (json.JSONDecodeError, ValueError) as e:
-                logger.error(f"Invalid JSON response for image prompt: {e}")
-                logger.error(f"Raw response: {enhanced_prompt}")
-                
-                # Fallback: create a structured JSON from the text response
-                fallback_json = {
-                    "prompt_type": "image_generation",
-                    "category": "general",
-                    "raw_prompt": enhanced_prompt,
-                    "final_prompt": enhanced_prompt,
-                    "note": "AI returned non-JSON format, wrapped in structured format",
-                    "parameters": {
-                        "description": enhanced_prompt
-                    }
+            # Fallback: create a structured JSON from the text response
+            fallback_json = {
+                "prompt_type": "image_generation",
+                "category": "general",
+                "raw_prompt": enhanced_prompt,
+                "final_prompt": enhanced_prompt,
+                "note": "AI returned non-JSON format, wrapped in structured format",
+                "parameters": {
+                    "description": enhanced_prompt
                 }
-                enhanced_prompt = json.dumps(fallback_json, indent=2, ensure_ascii=False)
+            }
+            enhanced_prompt = orjson.dumps(fallback_json, option=orjson.OPT_INDENT_2).decode()
+    
+    return enhanced_prompt
+
+def enhance_result(input_prompt, prompt_type, enhanced_prompt, api_provider, api_model, start_time, token_count=None, cached=False):
+    """Build the JSON body returned by /enhance; token_count is the provider's completion token count or None"""
+    # Calculate time taken
+    time_taken = time.time() - start_time
+    
+    return {
+        "enhanced_prompt": enhanced_prompt,
+        "original_prompt": input_prompt,
+        "prompt_type": prompt_type,
+        "metadata": {
+            "provider": api_provider,
+            "model": api_model,
+            "time_taken": round(time_taken, 2),
+            "token_count": token_count,
+            "cached": cached
+        }
+    }
+
+def prompt_error(input_prompt):
+    """Return an error response for an empty or oversized prompt, or None if it is acceptable"""
+    if not input_prompt:
+        return jsonify({"error": "No prompt provided"}), 400
+    
+    if len(input_prompt) > MAX_PROMPT_CHARS:
+        return jsonify({"error": f"Prompt is too long (maximum {MAX_PROMPT_CHARS} characters)"}), 413
+    
+    return None
+
+def parse_enhance_request(prompt_type=None, allow_batch=False):
+    """Validate the JSON body of an enhance request.
+
+    prompt_type comes from the URL on the per-type routes; otherwise it is read from the body.
+    With allow_batch, a "prompts" list is accepted in place of "prompt" and returned as a list.
+    Returns (input_prompt, prompt_type, error_response); error_response is None when the body is valid.
+    """
+    # The body is only read once, so don't keep a parsed copy on the request.
+    # Parsing happens outside the views' error handling, so malformed JSON must come back as None, not raise
+    data = request.get_json(cache=False, silent=True)
+    
+    if not data or not isinstance(data, dict):
+        return None, None, (jsonify({"error": "No JSON data provided"}), 400)
+        
+    if prompt_type is None:
+        prompt_type = data.get('type', 'user')  # Default to user prompt
+        if not isinstance(prompt_type, str):
+            return None, None, (jsonify({"error": "type must be a string"}), 400)
+        prompt_type = prompt_type.lower()
+    
+    prompts = data.get('prompts') if allow_batch else None
+    if prompts is not None:
+        if not isinstance(prompts, list) or not 0 < len(prompts) <= MAX_BATCH_PROMPTS or not all(isinstance(p, str) for p in prompts):
+            return None, None, (jsonify({"error": f"prompts must be a list of 1 to {MAX_BATCH_PROMPTS} strings"}), 400)
+        input_prompt = [p.strip() for p in prompts]
+        # Name the offending prompt so the caller can tell which one to fix
+        for position, p in enumerate(input_prompt, 1):
+            if not p:
+                return None, None, (jsonify({"error": f"Prompt {position} of the batch is empty"}), 400)
+            if len(p) > MAX_PROMPT_CHARS:
+                return None, None, (jsonify({"error": f"Prompt {position} of the batch is too long (maximum {MAX_PROMPT_CHARS} characters)"}), 413)
+        return input_prompt, prompt_type, None
+    
+    input_prompt = data.get('prompt', '')
+    if not isinstance(input_prompt, str):
+        return None, None, (jsonify({"error": "prompt must be a string"}), 400)
+    input_prompt = input_prompt.strip()
+    error_response = prompt_error(input_prompt)
+    if error_response:
+        return None, None, error_response
+    
+    return input_prompt, prompt_type, None
+
+def build_messages(input_prompt, prompt_type):
+    """Pair the prebuilt system message for the prompt type with the user's prompt"""
+    # Anything that is not a user or image prompt is treated as a system prompt
+    return [
+        SYSTEM_MESSAGES.get(prompt_type, SYSTEM_MESSAGES['system']),
+        {"role": "user", "content": input_prompt}
+    ]
+
+# Keep proxies (nginx, Heroku router buffering) from holding back streamed events
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no'
+}
+
+def sse_event(data, event=None):
+    """Format a JSON payload as a server-sent event"""
+    message = f"data: {orjson.dumps(data).decode()}\n\n"
+    if event:
+        message = f"event: {event}\n{message}"
+    return message
+
+def stream_groq_enhancement(messages, max_tokens):
+    """Yield content deltas from a streamed Groq completion and return its completion token count"""
+    stream = groq_client.chat.completions.create(
+        model=GROQ_MODEL,
+        messages=messages,
+        temperature=0.7,
+        max_tokens=max_tokens,
+        stream=True
+    )
+    completion_tokens = None
+    for chunk in stream:
+        if chunk.choices:
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+        # Groq reports usage on the final chunk under x_groq
+        usage = getattr(getattr(chunk, 'x_groq', None), 'usage', None)
+        if usage:
+            completion_tokens = usage.completion_tokens
+    return completion_tokens
+
+def stream_deepseek_enhancement(messages, max_tokens):
+    """Yield content deltas from a streamed DeepSeek completion and return its completion token count"""
+    with http_client.stream(
+        "POST",
+        DEEPSEEK_CHAT_URL,
+        headers=DEEPSEEK_HEADERS,
+        content=orjson.dumps({
+            "model": DEEPSEEK_MODEL,
+            "messages": messages,
+            "temperature": 0.7,
+            "max_tokens": max_tokens,
+            "stream": True,
+            "stream_options": {"include_usage": True}
+        }),
+        timeout=httpx.Timeout(30.0, connect=5.0)
+    ) as response:
+        response.raise_for_status()
+        completion_tokens = None
+        # OpenAI-style SSE: one "data: {...}" line per chunk, terminated by "data: [DONE]"
+        for line in response.iter_lines():
+            if not line.startswith("data: "):
+                continue
+            data = line[6:]
+            if data == "[DONE]":
+                break
+            chunk = orjson.loads(data)
+            choices = chunk.get("choices")
+            if choices:
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+            # With include_usage, the last chunk before [DONE] carries the usage totals
+            if chunk.get("usage"):
+                completion_tokens = chunk["usage"].get("completion_tokens")
+    return completion_tokens
+
+# In-flight enhancements by cache key, so concurrent identical requests share one API call
+inflight_enhancements = {}
+inflight_lock = threading.Lock()
+
+def claim_inflight(cache_key):
+    """Return (future, leader); the leader produces the result and resolves the future for the others"""
+    with inflight_lock:
+        future = inflight_enhancements.get(cache_key)
+        if future is not None:
+            return future, False
+        future = inflight_enhancements[cache_key] = Future()
+        return future, True
+
+def release_inflight(cache_key, future):
+    """Drop a leader's entry, failing any waiters if it stopped without a result"""
+    with inflight_lock:
+        inflight_enhancements.pop(cache_key, None)
+    if not future.done():
+        future.set_exception(RuntimeError("The identical in-flight enhancement did not finish"))
+
+def coalesced_enhancement(cache_key, input_prompt, prompt_type):
+    """Generate and clean an enhancement, joining an identical in-flight request if there is one.
+
+    Returns (enhanced_prompt, api_provider, api_model, token_count, error_message).
+    """
+    future, leader = claim_inflight(cache_key)
+    if not leader:
+        logger.info("Waiting on identical in-flight enhancement")
+        return future.result()
+    
+    try:
+        messages = build_messages(input_prompt, prompt_type)
+        enhanced_prompt, api_provider, api_model, token_count, error_message = generate_enhancement(messages, input_prompt, prompt_type)
+        if enhanced_prompt:
+            enhanced_prompt = clean_enhanced_prompt(enhanced_prompt, prompt_type)
+            # Remember API results so identical requests skip the round-trip (local fallbacks are not cached)
+            if api_provider != "Local":
+                cache_enhancement(cache_key, enhanced_prompt, api_provider, api_model, token_count)
+        result = (enhanced_prompt, api_provider, api_model, token_count, error_message)
+        future.set_result(result)
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        release_inflight(cache_key, future)
+
+def sse_deltas(deltas, parts):
+    """Re-yield text deltas as SSE events, collecting them in parts; returns what deltas returned"""
+    while True:
+        try:
+            delta = next(deltas)
+        except StopIteration as end:
+            return end.value
+        parts.append(delta)
+        yield sse_event({"delta": delta})
+
+def stream_enhancement(messages, input_prompt, prompt_type):
+    """Yield {"delta": ...} events from the first provider that streams a response.
+
+    Returns (enhanced_prompt, api_provider, api_model, token_count), falling back to the local rules.
+    """
+    max_tokens = max_output_tokens(input_prompt)
+    for api_provider, api_model, stream in configured_providers(streaming=True):
+        parts = []
+        try:
+            token_count = yield from sse_deltas(stream(messages, max_tokens), parts)
+        except Exception as stream_err:
+            # Tokens already sent cannot be retracted, so only fall back if nothing was streamed
+            if parts:
+                raise
+            logger.warning("%s streaming error, will try fallback: %s", api_provider, stream_err)
+            continue
+        enhanced_prompt = ''.join(parts).strip()
+        if enhanced_prompt:
+            return enhanced_prompt, api_provider, api_model, token_count
+    
+    # Last resort: the local enhancer, sent in one piece
+    logger.warning("All streaming API calls failed, using local enhancement as last resort")
+    return local_enhance(input_prompt, prompt_type), "Local", "Rule-based", None
+
+def enhance_one(input_prompt, prompt_type):
+    """Enhance one prompt, serving repeats from the cache.
+
+    Returns the /enhance result dict, or None if every enhancement method failed.
+    """
+    # Get start time for performance measurement
+    start_time = time.time()
+    
+    # Serve repeat prompts straight from the cache
+    cache_key = enhance_cache_key(prompt_type, input_prompt)
+    cached = get_cached_enhancement(cache_key)
+    if cached:
+        logger.info("Serving enhanced prompt from cache")
+        enhanced_prompt, api_provider, api_model, token_count = cached
+        return enhance_result(input_prompt, prompt_type, enhanced_prompt, api_provider, api_model, start_time, token_count, cached=True)
+    
+    enhanced_prompt, api_provider, api_model, token_count, error_message = coalesced_enhancement(cache_key, input_prompt, prompt_type)
+    
+    if not enhanced_prompt:
+        logger.error("All enhancement methods failed: %s", error_message)
+        return None
+    
+    return enhance_result(input_prompt, prompt_type, enhanced_prompt, api_provider, api_model, start_time, token_count)
+
+def enhance_batch_item(input_prompt, prompt_type):
+    """Enhance one prompt of a batch, turning its failure into an error entry so the others still return"""
+    try:
+        result = enhance_one(input_prompt, prompt_type)
+    except Exception as e:
+        logger.error("Error enhancing batch prompt: %s", e)
+        logger.error(traceback.format_exc())
+        return classify_error(e)
+    return result or {"error": "Failed to enhance prompt (all methods failed)"}
+
+@app.route('/enhance', methods=['POST'])
+@app.route('/enhance/<any(user, image, system):prompt_type>', methods=['POST'])
+@requires_auth
+def enhance_prompt(prompt_type=None):
+    """Enhance a prompt (or a "prompts" batch) using the selected API"""
+    # Parsed outside the try so an oversized body reaches the JSON 413 handler instead of becoming a 500
+    input_prompt, prompt_type, error_response = parse_enhance_request(prompt_type, allow_batch=True)
+    if error_response:
+        return error_response
+    
+    try:
+        # Log the user making the request
+        logger.info("Enhancement requested by: %s (User ID: %s)", session['profile'].get('name'), session['profile'].get('user_id'))
+        
+        # A batch fans out across the pool so its prompts wait on the APIs concurrently
+        if isinstance(input_prompt, list):
+            results = batch_executor.map(lambda p: enhance_batch_item(p, prompt_type), input_prompt)
+            return jsonify({"results": list(results)})
         
-        # Calculate time taken
-        time_taken = time.time() - start_time
+        result = enhance_one(input_prompt, prompt_type)
+        if not result:
+            return jsonify({"error": "Failed to enhance prompt (all methods failed)"}), 500
         
         # Return the enhanced prompt
-        return jsonify({
-            "enhanced_prompt": enhanced_prompt,
-            "original_prompt": input_prompt,
-            "prompt_type": prompt_type,
-            "metadata": {
-                "provider": api_provider,
-                "model": api_model,
-                "time_taken": round(time_taken, 2),
-                "token_count": len(enhanced_prompt.split()) if prompt_type != 'image' else len(enhanced_prompt)
-            }
-        })
+        return jsonify(result)
                 
     except Exception as e:
         error_message = str(e)
-        logger.error(f"Error enhancing prompt: {error_message}")
+        logger.error("Error enhancing prompt: %s", error_message)
         logger.error(traceback.format_exc())
         
         # Handle specific error types more gracefully
-        if "Unexpected token '<'" in error_message or "HTML" in error_message:
-            error_response = {
-                'error': 'The AI service returned an unexpected response format. This may be due to high demand or a temporary service issue.',
-                'details': 'Please try again in a moment, or try with a different prompt.',
-                'error_type': 'INVALID_RESPONSE_FORMAT'
-            }
-        elif "timeout" in error_message.lower():
-            error_response = {
-                'error': 'The request timed out. The AI service may be experiencing high demand.',
-                'details': 'Please try again in a moment.',
-                'error_type': 'TIMEOUT_ERROR'
-            }
-        elif "rate limit" in error_message.lower():
-            error_response = {
-                'error': 'Rate limit exceeded. Please wait a moment before trying again.',
-                'details': 'The AI service has temporary usage limits.',
-                'error_type': 'RATE_LIMIT_ERROR'
-            }
-        else:
-            error_response = {
-                'error': 'Failed to enhance prompt due to an unexpected error.',
-                'details': 'Please try again or contact support if the issue persists.',
-                'error_type': 'GENERAL_ERROR'
-            }
+        error_response = classify_error(e)
         
         return jsonify(error_response), 500
 
-@app.route('/system-health')
-def system_health():
-    """Endpoint to check system health including Redis connection"""
+@app.route('/enhance/stream', methods=['POST'])
+@app.route('/enhance/<any(user, image, system):prompt_type>/stream', methods=['POST'])
+@requires_auth
+def enhance_prompt_stream(prompt_type=None):
+    """Enhance a prompt, streaming tokens to the browser as server-sent events.
+
+    Plain events carry {"delta": ...} text chunks as Groq or DeepSeek produces them. A final
+    "done" event carries the cleaned result in the same shape as /enhance, or an
+    "error" event carries a user-facing error response.
+    """
+    input_prompt, prompt_type, error_response = parse_enhance_request(prompt_type)
+    if error_response:
+        return error_response
+    
+    # Log the user making the request
+    logger.info("Streaming enhancement requested by: %s (User ID: %s)", session['profile'].get('name'), session['profile'].get('user_id'))
+    
+    start_time = time.time()
+    cache_key = enhance_cache_key(prompt_type, input_prompt)
+    
+    def generate():
+        try:
+            cached = get_cached_enhancement(cache_key)
+            if cached:
+                logger.info("Serving enhanced prompt from cache")
+                enhanced_prompt, api_provider, api_model, token_count = cached
+                yield sse_event(enhance_result(input_prompt, prompt_type, enhanced_prompt, api_provider, api_model, start_time, token_count, cached=True), event='done')
+                return
+            
+            # An identical request (e.g. a double-click) is already running: send its result in one piece
+            future, leader = claim_inflight(cache_key)
+            if not leader:
+                logger.info("Waiting on identical in-flight enhancement")
+                enhanced_prompt, api_provider, api_model, token_count, error_message = future.result()
+                if not enhanced_prompt:
+                    raise RuntimeError(error_message or "All enhancement methods failed")
+                yield sse_event(enhance_result(input_prompt, prompt_type, enhanced_prompt, api_provider, api_model, start_time, token_count), event='done')
+                return
+            
+            try:
+                enhanced_prompt, api_provider, api_model, token_count = yield from stream_enhancement(build_messages(input_prompt, prompt_type), input_prompt, prompt_type)
+                enhanced_prompt = clean_enhanced_prompt(enhanced_prompt, prompt_type)
+                
+                # Remember API results so identical requests skip the round-trip (local fallbacks are not cached)
+                if api_provider != "Local":
+                    cache_enhancement(cache_key, enhanced_prompt, api_provider, api_model, token_count)
+                future.set_result((enhanced_prompt, api_provider, api_model, token_count, None))
+            except Exception as e:
+                future.set_exception(e)
+                raise
+            finally:
+                release_inflight(cache_key, future)
+            
+            yield sse_event(enhance_result(input_prompt, prompt_type, enhanced_prompt, api_provider, api_model, start_time, token_count), event='done')
+        except Exception as e:
+            logger.error("Error streaming enhanced prompt: %s", e)
+            logger.error(traceback.format_exc())
+            yield sse_event(classify_error(e), event='error')
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+# Health results are reused briefly so frequent uptime pings don't each hit Redis
+HEALTH_CACHE_TTL = 15  # seconds
+health_cache = SimpleCache(threshold=16, default_timeout=HEALTH_CACHE_TTL)
+
+def check_system_health():
+    """Collect component status, including a live Redis ping when Redis holds the sessions"""
     health = {
         "status": "ok",
         "timestamp": datetime.now().isoformat(),
@@ -754,6 +1198,15 @@ def system_health():
             health["components"]["redis"]["error"] = str(e)
             health["status"] = "degraded"
     
+    return health
+
+@app.route('/system-health')
+def system_health():
+    """Endpoint to check system health including Redis connection; ?force=1 skips the cache"""
+    health = None if request.args.get('force') == '1' else health_cache.get('system')
+    if health is None:
+        health = check_system_health()
+        health_cache.set('system', health)
     return jsonify(health)
 
 if __name__ == '__main__':
@@ -895,6 +895,12 @@ document.addEventListener('DOMContentLoaded', function() {
             return;
         }
         
+        // Ignore repeat clicks until this request finishes
+        if (enhanceBtn.disabled) {
+            return;
+        }
+        enhanceBtn.disabled = true;
+        
         // Show loading indicator and reset output
         loadingIndicator.style.display = 'block';
         outputContent.textContent = '';
@@ -903,8 +909,8 @@ document.addEventListener('DOMContentLoaded', function() {
         // Clear metadata containers
         clearMetadataContainers();
         
-        // Send request to the backend
-        fetch('/enhance', {
+        // Send request to the backend and stream the enhanced prompt as it is generated
+        fetch('/enhance/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -926,40 +932,26 @@ document.addEventListener('DOMContentLoaded', function() {
                     throw new Error(errorData.error || `Server error: ${response.status}`);
                 });
             }
-            return response.json();
-        })
-        .then(data => {
-            if (data.error) {
-                throw new Error(data.error);
-            }
             
-            if (!data.enhanced_prompt || data.enhanced_prompt.trim() === '') {
-                throw new Error('Received empty response from the server.');
-            }
-            
-            // Display the enhanced prompt with special formatting for image prompts
-            if (currentPromptType === 'image') {
-                displayImagePrompt(data.enhanced_prompt);
-            } else {
-                outputContent.textContent = data.enhanced_prompt;
-            }
-            
-            // Add metadata display below the output
-            const metadataHtml = `
-                <div class="output-metadata">
-                    <span>Provider: ${data.metadata.provider}</span>
-                    <span>Model: ${data.metadata.model}</span>
-                    <span>Time: ${data.metadata.time_taken}s</span>
-                </div>
-            `;
-            
-            // Create a container for the metadata
-            const metadataContainer = document.createElement('div');
-            metadataContainer.className = 'metadata-container';
-            metadataContainer.innerHTML = metadataHtml;
-            
-            // Add the metadata after the output content
-            outputContent.parentNode.insertBefore(metadataContainer, outputContent.nextSibling);
+            let finished = false;
+            return readEventStream(response, {
+                message: data => {
+                    // Show tokens as they arrive; the final event replaces them with the cleaned result
+                    outputContent.textContent += data.delta;
+                },
+                done: data => {
+                    finished = true;
+                    displayEnhancement(data);
+                },
+                error: data => {
+                    finished = true;
+                    throw new Error(data.error || 'Enhancement failed.');
+                }
+            }).then(() => {
+                if (!finished) {
+                    throw new Error('The connection closed before the enhanced prompt was complete.');
+                }
+            });
         })
         .catch(error => {
             console.error('Error:', error);
@@ -984,9 +976,77 @@ document.addEventListener('DOMContentLoaded', function() {
         })
         .finally(() => {
             loadingIndicator.style.display = 'none';
+            enhanceBtn.disabled = false;
         });
     });
     
+    // Read a server-sent event stream from a fetch response, passing each event's JSON data to its handler
+    async function readEventStream(response, handlers) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+            
+            // Events are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                
+                let eventName = 'message';
+                let eventData = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event: ')) {
+                        eventName = line.slice(7);
+                    } else if (line.startsWith('data: ')) {
+                        eventData += line.slice(6);
+                    }
+                });
+                
+                if (eventData && handlers[eventName]) {
+                    handlers[eventName](JSON.parse(eventData));
+                }
+            }
+        }
+    }
+    
+    // Display a finished enhancement and its metadata
+    function displayEnhancement(data) {
+        if (!data.enhanced_prompt || data.enhanced_prompt.trim() === '') {
+            throw new Error('Received empty response from the server.');
+        }
+        
+        // Display the enhanced prompt with special formatting for image prompts
+        if (currentPromptType === 'image') {
+            displayImagePrompt(data.enhanced_prompt);
+        } else {
+            outputContent.textContent = data.enhanced_prompt;
+        }
+        
+        // Add metadata display below the output
+        const metadataHtml = `
+            <div class="output-metadata">
+                <span>Provider: ${data.metadata.provider}</span>
+                <span>Model: ${data.metadata.model}</span>
+                <span>Time: ${data.metadata.time_taken}s</span>
+            </div>
+        `;
+        
+        // Create a container for the metadata
+        const metadataContainer = document.createElement('div');
+        metadataContainer.className = 'metadata-container';
+        metadataContainer.innerHTML = metadataHtml;
+        
+        // Add the metadata after the output content
+        outputContent.parentNode.insertBefore(metadataContainer, outputContent.nextSibling);
+    }
+    
     // Function to display JSON formatted image prompts
     function displayImagePrompt(jsonString) {
         try {